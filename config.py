@@ -23,7 +23,7 @@ INDOOR_TEMP_THRESHOLD = 25    # start if inside temp is above this
 
 # ------------------- Active Days -------------------
 # 0=Monday, 6=Sunday
-DAYS = [0, 1, 2, 3, 4, 5, 6]  # default: all days
+DAYS = frozenset({0, 1, 2, 3, 4, 5, 6})  # default: all days
 
 # ------------------- Optional Logging -------------------
 # LOG_FILE = "tesla_hvac.log"  # filename controlled in main script
@@ -13,7 +13,7 @@ Description:
 
 Features:
 - Robust API handling: retries, token refresh, timeouts.
-- Scheduled execution using 'schedule' module.
+- Scheduled execution by sleeping until the configured START_TIME.
 - Wake-up logic to handle sleeping vehicles.
 - Adjustable parameters in 'config.py' for client ID, refresh token,
   vehicle ID, target temperature, days of operation, start time,
@@ -27,11 +27,24 @@ Usage:
 """
 
 
+import base64
+import concurrent.futures
+import json
+import os
+import random
 import requests
-import schedule
 import time
 import logging
 import datetime
+from logging.handlers import RotatingFileHandler
+from urllib.parse import quote
+from urllib3.util import Retry
+try:
+    # orjson parses the vehicle_data payload ~3x faster than stdlib json.
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
 from config import (
     TESLA_CLIENT_ID,
     TESLA_REFRESH_TOKEN,
@@ -45,194 +58,341 @@ from config import (
 )
 
 # ------------------- Logging -------------------
-logging.basicConfig(
-    filename="tesla_hvac.log",
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
+logger = logging.getLogger("tesla_hvac")
+logger.setLevel(logging.INFO)
+_handler = RotatingFileHandler("tesla_hvac.log", maxBytes=1_000_000, backupCount=5)
+_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+logger.addHandler(_handler)
 
 ACCESS_TOKEN = None
+TOKEN_EXPIRES_AT = 0  # epoch seconds after which the token must be refreshed
+
+# Shared read-only fallback so missing sub-dicts don't allocate a fresh {} per lookup.
+_EMPTY = {}
+
+# Persistent session: reuses keep-alive connections and TLS sessions across
+# the wake / vehicle_data / command calls instead of a fresh handshake each time.
+# Transport retries, exponential backoff and Retry-After handling all live on
+# the adapter, so the API helpers below stay single-shot.
+SESSION = requests.Session()
+SESSION.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=2, pool_maxsize=4,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1.0,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+    ),
+))
+SESSION.headers["User-Agent"] = "tesla-daily-hvac"
+
+# Endpoint URLs, interpolated once at load instead of on every call.
+TOKEN_URL = "https://auth.tesla.com/oauth2/v3/token"
+API_BASE = "https://owner-api.teslamotors.com/api/1"
+VEHICLE_URL = f"{API_BASE}/vehicles/{VEHICLE_ID}"
+WAKE_URL = f"{VEHICLE_URL}/wake_up"
+DATA_URL = f"{VEHICLE_URL}/vehicle_data"
+HVAC_START_URL = f"{VEHICLE_URL}/command/auto_conditioning_start"
+HVAC_STOP_URL = f"{VEHICLE_URL}/command/auto_conditioning_stop"
+SET_TEMPS_URL = f"{VEHICLE_URL}/command/set_temps"
 
 # ------------------- Tesla API Helpers -------------------
-def get_access_token(retries=3):
-    """Fetch or refresh Tesla access token with retries."""
-    global ACCESS_TOKEN
-    url = "https://auth.tesla.com/oauth2/v3/token"
-    data = {
-        "grant_type": "refresh_token",
-        "client_id": TESLA_CLIENT_ID,
-        "refresh_token": TESLA_REFRESH_TOKEN,
-    }
-    for attempt in range(retries):
+def _jwt_payload(token):
+    """Decode the payload of a JWT without verifying the signature."""
+    payload = token.split(".")[1]
+    payload += "=" * (-len(payload) % 4)  # restore base64 padding
+    return json.loads(base64.urlsafe_b64decode(payload))
+
+# Access token survives restarts via a small on-disk cache, saving the
+# refresh round-trip on every crash/systemd restart and reducing token churn.
+_TOKEN_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "tesla_hvac", "token.json")
+
+def _load_cached_token():
+    """Adopt the persisted access token if it is still comfortably valid."""
+    global ACCESS_TOKEN, TOKEN_EXPIRES_AT
+    try:
+        with open(_TOKEN_CACHE_PATH) as f:
+            cached = json.load(f)
+        if cached["exp"] > time.time() + 60:
+            ACCESS_TOKEN = cached["access_token"]
+            TOKEN_EXPIRES_AT = cached["exp"]
+            SESSION.headers["Authorization"] = f"Bearer {ACCESS_TOKEN}"
+            logger.info("Reusing cached access token from previous run.")
+    except (OSError, ValueError, KeyError):
+        pass  # no cache yet, or unreadable — a fresh token will be fetched on demand
+
+def _save_cached_token():
+    """Persist the current token atomically with owner-only permissions."""
+    try:
+        os.makedirs(os.path.dirname(_TOKEN_CACHE_PATH), exist_ok=True)
+        tmp = _TOKEN_CACHE_PATH + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"access_token": ACCESS_TOKEN, "exp": TOKEN_EXPIRES_AT}, f)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, _TOKEN_CACHE_PATH)
+    except OSError as e:
+        logger.warning(f"Could not persist access token cache: {e}")
+
+# Refresh-token POST body never changes, so build it once.
+_TOKEN_POST_BODY = {
+    "grant_type": "refresh_token",
+    "client_id": TESLA_CLIENT_ID,
+    "refresh_token": TESLA_REFRESH_TOKEN,
+}
+
+def _preflight_refresh_token():
+    """Sanity-check the configured refresh token before the first HTTP call.
+
+    An expired or malformed token would otherwise burn three doomed refresh
+    attempts (~30 s of retries) before the job fails anyway.
+    """
+    try:
+        payload = _jwt_payload(TESLA_REFRESH_TOKEN)
+    except (ValueError, IndexError):
+        logger.warning("TESLA_REFRESH_TOKEN does not look like a JWT; skipping preflight check.")
+        return
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        logger.error("TESLA_REFRESH_TOKEN is expired; token refresh will fail until it is replaced.")
+    elif exp is not None:
+        logger.info(f"Refresh token valid for another {(exp - time.time()) / 86400:.1f} days "
+                    f"(aud={payload.get('aud')}, scope={payload.get('scp')}).")
+
+_preflight_refresh_token()
+_load_cached_token()
+
+def get_access_token():
+    """Fetch or refresh the Tesla access token."""
+    global ACCESS_TOKEN, TOKEN_EXPIRES_AT
+    try:
+        r = SESSION.post(TOKEN_URL, json=_TOKEN_POST_BODY, timeout=10)
+        r.raise_for_status()
+        ACCESS_TOKEN = r.json().get("access_token")
+        SESSION.headers["Authorization"] = f"Bearer {ACCESS_TOKEN}"
         try:
-            r = requests.post(url, json=data, timeout=10)
-            r.raise_for_status()
-            ACCESS_TOKEN = r.json().get("access_token")
-            logging.info("Obtained new Tesla access token.")
-            return True
-        except requests.RequestException as e:
-            logging.warning(f"Token fetch attempt {attempt+1} failed: {e}")
-            time.sleep(2)
-    logging.error("Failed to obtain access token after multiple attempts.")
-    return False
-
-def api_get(endpoint, retries=3, delay=2, timeout=30):
-    """GET request with retry and token refresh."""
-    global ACCESS_TOKEN
-    for attempt in range(retries):
-        if not ACCESS_TOKEN:
+            # Rotate 60 s before the JWT expires so calls never hit the 401 path.
+            TOKEN_EXPIRES_AT = _jwt_payload(ACCESS_TOKEN)["exp"] - 60
+        except (ValueError, KeyError, IndexError):
+            TOKEN_EXPIRES_AT = time.time() + 3600
+            logger.warning("Could not read exp claim from access token, assuming 1h validity.")
+        _save_cached_token()
+        logger.info("Obtained new Tesla access token.")
+        return True
+    except requests.RequestException as e:
+        logger.error(f"Failed to obtain access token: {e}")
+        return False
+
+def _ensure_token():
+    return (ACCESS_TOKEN and time.time() < TOKEN_EXPIRES_AT) or get_access_token()
+
+def api_get(url, timeout=30):
+    """GET request; transport retries and 429 backoff happen in the Session adapter."""
+    if not _ensure_token():
+        return None
+    try:
+        r = SESSION.get(url, timeout=timeout)
+        if r.status_code == 401:
+            # Safety net: refresh rewrites the session header, so retry once by hand.
+            logger.info("Access token expired, refreshing...")
             if not get_access_token():
                 return None
-        headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
-        url = f"https://owner-api.teslamotors.com/api/1{endpoint}"
-        try:
-            r = requests.get(url, headers=headers, timeout=timeout)
-            if r.status_code == 401:
-                logging.info("Access token expired, refreshing...")
-                get_access_token()
-                continue
-            r.raise_for_status()
-            return r.json()
-        except requests.RequestException as e:
-            logging.warning(f"GET {endpoint} attempt {attempt+1} failed: {e}")
-            time.sleep(delay)
-    logging.error(f"GET {endpoint} failed after {retries} attempts.")
-    return None
+            r = SESSION.get(url, timeout=timeout)
+        r.raise_for_status()
+        return _json_loads(r.content)
+    except requests.RequestException as e:
+        logger.error(f"GET {url} failed: {e}")
+        return None
 
-def api_post(endpoint, data=None, retries=3, delay=2):
-    """POST request with retry and token refresh."""
-    global ACCESS_TOKEN
-    for attempt in range(retries):
-        if not ACCESS_TOKEN:
+def api_post(url, data=None, timeout=30):
+    """POST request; transport retries and 429 backoff happen in the Session adapter."""
+    if not _ensure_token():
+        return None
+    try:
+        r = SESSION.post(url, json=data or {}, timeout=timeout)
+        if r.status_code == 401:
+            logger.info("Access token expired, refreshing...")
             if not get_access_token():
                 return None
-        headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
-        url = f"https://owner-api.teslamotors.com/api/1{endpoint}"
-        try:
-            r = requests.post(url, headers=headers, json=data or {}, timeout=30)
-            if r.status_code == 401:
-                logging.info("Access token expired, refreshing...")
-                get_access_token()
-                continue
-            r.raise_for_status()
-            return r.json()
-        except requests.RequestException as e:
-            logging.warning(f"POST {endpoint} attempt {attempt+1} failed: {e}")
-            time.sleep(delay)
-    logging.error(f"POST {endpoint} failed after {retries} attempts.")
-    return None
+            r = SESSION.post(url, json=data or {}, timeout=timeout)
+        r.raise_for_status()
+        return _json_loads(r.content)
+    except requests.RequestException as e:
+        logger.error(f"POST {url} failed: {e}")
+        return None
 
 # ------------------- Vehicle Helpers -------------------
 def wake_vehicle():
-    resp = api_post(f"/vehicles/{VEHICLE_ID}/wake_up")
+    resp = api_post(WAKE_URL)
     if resp:
-        logging.info("Sent wake_up command to Tesla.")
+        logger.info("Sent wake_up command to Tesla.")
     else:
-        logging.warning("Wake_up command failed or no response.")
-
-def get_vehicle_data(retries=5, delay=10):
-    """Fetch vehicle data with retries and wake attempts."""
-    for attempt in range(retries):
-        data = api_get(f"/vehicles/{VEHICLE_ID}/vehicle_data", timeout=30)
-        if data:
-            logging.info(f"Vehicle data fetched successfully on attempt {attempt+1}.")
-            return data
-        logging.warning(f"Vehicle data not ready, retry {attempt+1}/{retries}. Waiting {delay}s...")
+        logger.warning("Wake_up command failed or no response.")
+
+def is_online():
+    """Cheap state probe: GET /vehicles/{id} returns just the state, no telemetry."""
+    resp = api_get(VEHICLE_URL) or _EMPTY
+    return (resp.get("response") or _EMPTY).get("state") == "online"
+
+# Short TTL cache so back-to-back readers share one fetch instead of
+# double-polling the API (which Tesla answers with 408/429 throttling).
+_VEHICLE_DATA_TTL = 30  # seconds
+_vehicle_data_cache = {"t": 0.0, "data": None, "endpoints": frozenset()}
+
+def get_vehicle_data(retries=5, delay=10, endpoints="climate_state;drive_state;vehicle_state",
+                     force=False):
+    """Fetch vehicle data with retries and wake attempts.
+
+    Only the requested endpoints are fetched; the full vehicle_data blob is
+    5-10x larger than the climate/drive state this script actually reads.
+    A recent response covering the requested endpoints is served from the
+    TTL cache unless force=True.
+    """
+    wanted = frozenset(endpoints.split(";"))
+    if (not force and _vehicle_data_cache["data"] is not None
+            and time.monotonic() - _vehicle_data_cache["t"] < _VEHICLE_DATA_TTL
+            and wanted <= _vehicle_data_cache["endpoints"]):
+        logger.info("Serving vehicle data from cache.")
+        return _vehicle_data_cache["data"]
+    # Probe the cheap /vehicles/{id} state first: an online car (the common
+    # case) skips straight to the data fetch, a sleeping one gets wake_up
+    # without wasting a vehicle_data attempt that is guaranteed to time out.
+    if not is_online():
+        logger.info("Vehicle not online → sending wake_up and polling state.")
         wake_vehicle()
-        time.sleep(delay)
-    logging.error("Failed to fetch vehicle data after multiple retries.")
+        for attempt in range(retries):
+            sleep_s = min(60, delay * (2 ** attempt)) + random.uniform(0, delay)
+            logger.warning(f"Vehicle still waking, retry {attempt+1}/{retries}. Waiting {sleep_s:.1f}s...")
+            time.sleep(sleep_s)
+            if is_online():
+                break
+        else:
+            logger.error("Vehicle did not come online after wake attempts.")
+            return None
+    data = api_get(f"{DATA_URL}?endpoints={quote(endpoints)}", timeout=30)
+    if data:
+        _vehicle_data_cache.update(t=time.monotonic(), data=data, endpoints=wanted)
+        logger.info("Vehicle data fetched successfully.")
+        return data
+    logger.error("Failed to fetch vehicle data.")
     return None
 
-def start_hvac():
-    resp_start = api_post(f"/vehicles/{VEHICLE_ID}/command/auto_conditioning_start")
-    resp_set_temp = api_post(f"/vehicles/{VEHICLE_ID}/command/set_temps",
-                             {"driver_temp": TARGET_TEMP, "passenger_temp": TARGET_TEMP})
-    logging.info(f"HVAC started. Start response: {resp_start}, Set Temp response: {resp_set_temp}")
+def start_hvac(climate=_EMPTY):
+    # The car usually still holds yesterday's setpoints, so skip set_temps
+    # when the just-fetched climate_state already matches TARGET_TEMP.
+    if (climate.get("driver_temp_setting") == TARGET_TEMP
+            and climate.get("passenger_temp_setting") == TARGET_TEMP):
+        resp_start = api_post(HVAC_START_URL)
+        logger.info(f"HVAC started. Start response: {resp_start}; "
+                    f"set_temps skipped, setpoints already at {TARGET_TEMP}°C.")
+        return
+    # The two commands are independent once the car is awake, so submit them
+    # in parallel and pay one round-trip instead of two.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        fut_start = pool.submit(api_post, HVAC_START_URL)
+        fut_set_temp = pool.submit(api_post, SET_TEMPS_URL,
+                                   {"driver_temp": TARGET_TEMP, "passenger_temp": TARGET_TEMP})
+        resp_start = fut_start.result()
+        resp_set_temp = fut_set_temp.result()
+    logger.info(f"HVAC started. Start response: {resp_start}, Set Temp response: {resp_set_temp}")
 
 def stop_hvac():
-    resp_stop = api_post(f"/vehicles/{VEHICLE_ID}/command/auto_conditioning_stop")
-    logging.info(f"HVAC stopped. Stop response: {resp_stop}")
+    resp_stop = api_post(HVAC_STOP_URL)
+    logger.info(f"HVAC stopped. Stop response: {resp_stop}")
 
 # ------------------- Core Logic -------------------
 def hvac_job():
     """Main daily HVAC job with OR temperature check and detailed debug logging."""
-    logging.info(f"=== HVAC Job Triggered at {datetime.datetime.now()} ===")
-    
+    # Re-check the weekday here: the process may have been started on a valid
+    # day and only fire after midnight on an off-day. Skipping before any API
+    # call saves the whole wake + vehicle_data round-trip.
+    if datetime.datetime.now().weekday() not in DAYS:
+        logger.info("Off-day, skipping HVAC job.")
+        return
+
+    logger.info("=== HVAC Job Triggered at %s ===", datetime.datetime.now())
+
     data = get_vehicle_data()
     if not data:
-        logging.error("Skipping HVAC job: vehicle data unavailable.")
+        logger.error("Skipping HVAC job: vehicle data unavailable.")
         return
 
     try:
-        response = data.get("response", {})
-        climate = response.get("climate_state", {})
-        drive = response.get("drive_state", {})
+        response = data.get("response") or _EMPTY
+        climate = response.get("climate_state") or _EMPTY
+        drive = response.get("drive_state") or _EMPTY
 
         state = response.get("state")
-        outside_temp = climate.get("outside_temp")
-        inside_temp = climate.get("inside_temp")
+        outside_temp, inside_temp = climate.get("outside_temp"), climate.get("inside_temp")
         speed = drive.get("speed")
 
-        logging.info(f"Vehicle state: {state}, Speed: {speed}")
-        logging.info(f"Outside Temp={outside_temp}°C, Inside Temp={inside_temp}°C")
-
         trigger_reasons = []
         if outside_temp is not None and outside_temp < OUTDOOR_TEMP_THRESHOLD:
             trigger_reasons.append(f"Outside temp {outside_temp}°C < {OUTDOOR_TEMP_THRESHOLD}°C")
         if inside_temp is not None and inside_temp > INDOOR_TEMP_THRESHOLD:
             trigger_reasons.append(f"Inside temp {inside_temp}°C > {INDOOR_TEMP_THRESHOLD}°C")
 
+        # One coalesced record per job: single lock acquire, timestamp and write().
+        logger.info("HVAC job: state=%s speed=%s, outside=%s°C inside=%s°C → %s",
+                    state, speed, outside_temp, inside_temp,
+                    f"starting HVAC ({', '.join(trigger_reasons)})" if trigger_reasons
+                    else "conditions NOT met, skipping HVAC")
+
         if trigger_reasons:
-            logging.info(f"Temperature condition met → starting HVAC due to: {', '.join(trigger_reasons)}")
-            start_hvac()
-            schedule.every(CHECK_DELAY).seconds.do(check_shutdown).tag("shutdown_check")
-        else:
-            logging.info("Temperature conditions NOT met → skipping HVAC.")
+            start_hvac(climate)
+            time.sleep(CHECK_DELAY)
+            check_shutdown()
 
     except Exception as e:
-        logging.error(f"Error in hvac_job: {e}")
+        logger.error(f"Error in hvac_job: {e}")
 
 
 def check_shutdown():
     """Check if car moved after CHECK_DELAY seconds; stop HVAC if idle."""
-    schedule.clear("shutdown_check")
-    data = get_vehicle_data()
+    # force=True: the decision to stop HVAC needs current speed, never a cached one.
+    data = get_vehicle_data(endpoints="drive_state;vehicle_state", force=True)
     if not data:
-        logging.error("Shutdown check skipped: vehicle data unavailable.")
+        logger.error("Shutdown check skipped: vehicle data unavailable.")
         return
 
     try:
-        drive = data.get("response", {}).get("drive_state", {})
+        response = data.get("response") or _EMPTY
+        drive = response.get("drive_state") or _EMPTY
         speed = drive.get("speed")
-        state = data.get("response", {}).get("state")
-
-        logging.info(f"Shutdown check → Vehicle state: {state}, Speed={speed}")
+        state = response.get("state")
 
         if speed is None or speed == 0:
             stop_hvac()
-            logging.info(f"HVAC stopped after {CHECK_DELAY}s because car idle.")
+            logger.info("Shutdown check: state=%s speed=%s → HVAC stopped after %ss because car idle.",
+                        state, speed, CHECK_DELAY)
         else:
-            logging.info("Car is moving → HVAC remains active.")
+            logger.info("Shutdown check: state=%s speed=%s → car is moving, HVAC remains active.",
+                        state, speed)
 
     except Exception as e:
-        logging.error(f"Error in shutdown check: {e}")
+        logger.error(f"Error in shutdown check: {e}")
 
 # ------------------- Scheduler -------------------
-def schedule_hvac_job():
-    today_weekday = datetime.datetime.now().weekday()  # 0=Monday, 6=Sunday
-    if today_weekday in DAYS:
-        schedule.every().day.at(START_TIME).do(hvac_job)
-        logging.info(f"Tesla HVAC job scheduled for today ({today_weekday}) at {START_TIME}.")
-    else:
-        logging.info(f"Today ({today_weekday}) not in configured DAYS → skipping HVAC schedule.")
+def next_run_time(now):
+    """Next occurrence of START_TIME, rolled to tomorrow if already past."""
+    target = datetime.datetime.combine(now.date(), datetime.time.fromisoformat(START_TIME))
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return target
 
-schedule_hvac_job()
-logging.info("Tesla HVAC script started.")
+logger.info("Tesla HVAC script started.")
 
 while True:
     try:
-        schedule.run_pending()
-        time.sleep(1)
+        now = datetime.datetime.now()
+        target = next_run_time(now)
+        logger.info(f"Sleeping until {target} for the next HVAC job.")
+        time.sleep((target - now).total_seconds())
+        today_weekday = datetime.datetime.now().weekday()  # 0=Monday, 6=Sunday
+        if today_weekday in DAYS:
+            hvac_job()
+        else:
+            logger.info(f"Today ({today_weekday}) not in configured DAYS → skipping HVAC job.")
     except Exception as e:
-        logging.error(f"Unexpected error in main loop: {e}")
+        logger.error(f"Unexpected error in main loop: {e}")
         time.sleep(5)